@@ -1,33 +1,77 @@
 """
 SAP HANA database backend for Django.
 """
+import functools
 import logging
+import os
+import re
 import sys
-from time import time
+import threading
+import types
+import weakref
+from contextlib import contextmanager
+from itertools import islice
+from time import perf_counter
 
 from django.contrib.gis.db.backends.base.features import BaseSpatialFeatures
 from django.db import utils
 from django.db.backends.base.base import BaseDatabaseWrapper
 from django.db.backends.base.features import BaseDatabaseFeatures
 from django.db.backends.base.validation import BaseDatabaseValidation
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
 from django.db.transaction import TransactionManagementError
-from django.utils import six
+from django.utils.functional import cached_property
 
 try:
     import pyhdb as Database
-    setattr(Database, 'Binary', Database.Blob)  # add mapping form Binary to BLOB
 except ImportError as e:
     from django.core.exceptions import ImproperlyConfigured
     raise ImproperlyConfigured('Error loading PyHDB module: %s' % e)
 
+if not hasattr(Database, 'Binary'):
+    Database.Binary = Database.Blob  # add mapping form Binary to BLOB
+
 from django_hana.client import DatabaseClient               # NOQA isort:skip
 from django_hana.creation import DatabaseCreation           # NOQA isort:skip
 from django_hana.introspection import DatabaseIntrospection # NOQA isort:skip
 from django_hana.operations import DatabaseOperations       # NOQA isort:skip
+from django_hana.pool import ConnectionPool                 # NOQA isort:skip
 from django_hana.schema import DatabaseSchemaEditor         # NOQA isort:skip
 
 logger = logging.getLogger('django.db.backends')
 
+# %s placeholders outside of string literals, %% escapes are kept as they are
+_PLACEHOLDER_RE = re.compile(r"'(?:[^']|'')*'|%%|(%s)")
+
+# schema names which can be used unquoted in SET SCHEMA
+_SCHEMA_NAME_RE = re.compile(r'[A-Z_][A-Z0-9_]*')
+
+# default schema already set on a connection, so reused connections don't set it again
+_connection_schemas = weakref.WeakKeyDictionary()
+
+# connection pools by process id and connection params, see OPTIONS['POOL']
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1024)
+def _translate_sql(sql):
+    """
+    converts %s style placeholders to ?, memoized since django reissues the same sql over and over
+    """
+    return _PLACEHOLDER_RE.sub(lambda m: '?' if m.group(1) else m.group(0), sql)
+
+
+def _ichunked(iterable, size):
+    """
+    yields tuples of up to size items without materializing the whole iterable
+    """
+    iterator = iter(iterable)
+    chunk = tuple(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = tuple(islice(iterator, size))
+
 
 class DatabaseFeatures(BaseDatabaseFeatures, BaseSpatialFeatures):
     needs_datetime_string_cast = True
@@ -48,6 +92,52 @@ class DatabaseFeatures(BaseDatabaseFeatures, BaseSpatialFeatures):
     requires_literal_defaults = True
 
 
+@contextmanager
+def _map_errors(codes_for_integrityerror):
+    """
+    re-raises PyHDB errors as django's database errors
+    """
+    try:
+        yield
+    except Database.IntegrityError as e:
+        raise utils.IntegrityError(*e.args) from e
+    except Database.Error as e:
+        # Map some error codes to IntegrityError, since they seem to be
+        # misclassified and Django would prefer the more logical place.
+        if getattr(e, 'code', None) in codes_for_integrityerror:
+            raise utils.IntegrityError(*e.args) from e
+        raise utils.DatabaseError(*e.args) from e
+
+
+def _sanitize_blob(value):
+    if isinstance(value, Database.Blob):
+        value = value.encode()
+    return value
+
+
+def _sanitize_params(params):
+    if isinstance(params, (list, tuple)):
+        if any(isinstance(p, Database.Blob) for p in params):
+            params = [_sanitize_blob(p) for p in params]
+        return params
+    return _sanitize_blob(params)
+
+
+class TruncatedRepr(object):
+    """
+    repr of a value cut to limit characters, only built when a log record is formatted
+    """
+    def __init__(self, value, limit=500):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = repr(self.value)
+        if len(text) > self.limit:
+            text = text[:self.limit] + '...'
+        return text
+
+
 class CursorWrapper(object):
     """
     Hana doesn't support %s placeholders
@@ -59,13 +149,26 @@ class CursorWrapper(object):
         self.cursor = cursor
         self.db = db
         self.is_hana = True
+        self._rows_sent = None  # rows sent by the last paged executemany
+        self._closed = False
+        # bind the fetch methods directly so result iteration doesn't go through __getattr__
+        self.fetchone = cursor.fetchone
+        self.fetchmany = cursor.fetchmany
+        self.fetchall = cursor.fetchall
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
 
     def set_dirty(self):
         if not self.db.get_autocommit():
             self.db.set_dirty()
 
     def __getattr__(self, attr):
-        self.set_dirty()
         if attr in self.__dict__:
             return self.__dict__[attr]
         else:
@@ -74,149 +177,177 @@ class CursorWrapper(object):
     def __iter__(self):
         try:
             return iter(self.cursor)
-        except TypeError: # need to call fetchall
-            return iter(self.cursor.fetchall())
+        except TypeError:  # page through the result set
+            return self._iter_rows()
+
+    def _iter_rows(self):
+        # PyHDB defaults to an arraysize of 1, which would fetch the rows one at a time
+        size = max(self.cursor.arraysize or 0, GET_ITERATOR_CHUNK_SIZE)
+        while True:
+            rows = self.cursor.fetchmany(size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        # self.cursor.close()
-        pass
+        self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.cursor.close()
 
     def execute(self, sql, params=()):
         """
         execute with replaced placeholders
         """
-        try:
+        self.set_dirty()
+        with _map_errors(self.codes_for_integrityerror):
             self.cursor.execute(self._replace_params(sql), params)
-        except Database.IntegrityError as e:
-            six.reraise(utils.IntegrityError, utils.IntegrityError(*tuple(e.args)), sys.exc_info()[2])
-        except Database.Error as e:
-            # Map some error codes to IntegrityError, since they seem to be
-            # misclassified and Django would prefer the more logical place.
-            if e[0] in self.codes_for_integrityerror:
-                six.reraise(utils.IntegrityError, utils.IntegrityError(*tuple(e.args)), sys.exc_info()[2])
-            six.reraise(utils.DatabaseError, utils.DatabaseError(*tuple(e.args)), sys.exc_info()[2])
 
     def executemany(self, sql, param_list):
-        try:
-            self.cursor.executemany(self._replace_params(sql), param_list)
-        except Database.IntegrityError as e:
-            six.reraise(utils.IntegrityError, utils.IntegrityError(*tuple(e.args)), sys.exc_info()[2])
-        except Database.Error as e:
-            # Map some error codes to IntegrityError, since they seem to be
-            # misclassified and Django would prefer the more logical place.
-            if e[0] in self.codes_for_integrityerror:
-                six.reraise(utils.IntegrityError, utils.IntegrityError(*tuple(e.args)), sys.exc_info()[2])
-            six.reraise(utils.DatabaseError, utils.DatabaseError(*tuple(e.args)), sys.exc_info()[2])
+        """
+        executemany with replaced placeholders, an iterator of params is sent in pages of BULK_INSERT_CHUNK rows
+        """
+        self.set_dirty()
+        sql = self._replace_params(sql)
+        self._rows_sent = None
+        with _map_errors(self.codes_for_integrityerror):
+            # PyHDB already splits a sequence of rows into size bounded EXECUTE messages but needs len() of the rows,
+            # so any other iterable is paged
+            if not isinstance(param_list, (list, tuple)):
+                # the statement is prepared once and reused for every page, rowcount reports the last page only
+                statement = None
+                self._rows_sent = 0
+                for chunk in _ichunked(param_list, self.db.bulk_insert_chunk):
+                    if statement is None:
+                        statement = self.cursor.get_prepared_statement(self.cursor.prepare(sql))
+                    self.cursor.execute_prepared(statement, chunk)
+                    self._rows_sent += len(chunk)
+            else:
+                self.cursor.executemany(sql, param_list)
 
     def _replace_params(self, sql):
         """
         converts %s style placeholders to ?
         """
-        return sql.replace('%s', '?')
+        return _translate_sql(sql) if '%s' in sql else sql
 
 
 class CursorDebugWrapper(CursorWrapper):
     def execute(self, sql, params=()):
-        self.set_dirty()
-        start = time()
+        start = perf_counter()
         try:
             return CursorWrapper.execute(self, sql, params)
         finally:
-            stop = time()
+            stop = perf_counter()
             duration = stop - start
 
-            def sanitize_blob(value):
-                if isinstance(value, Database.Blob):
-                    value = value.encode()
-                return value
-
-            params = [sanitize_blob(p) for p in params] if isinstance(params, (list, tuple)) else params
-            params = sanitize_blob(params)
-
+            params = _sanitize_params(params)
             sql = self.db.ops.last_executed_query(self.cursor, sql, params)
-            self.db.queries.append({
+            self.db.queries_log.append({
                 'sql': sql,
                 'time': '%.3f' % duration,
             })
-            logger.debug('(%.3f) %s; args=%s' % (duration, sql, params), extra={
+            logger.debug('(%.3f) %s; args=%s', duration, sql, params, extra={
                 'duration': duration,
                 'sql': sql,
                 'params': params,
             })
 
     def executemany(self, sql, param_list):
-        self.set_dirty()
-        start = time()
+        start = perf_counter()
         try:
             return CursorWrapper.executemany(self, sql, param_list)
         finally:
-            stop = time()
+            stop = perf_counter()
             duration = stop - start
-            try:
-                times = len(param_list)
-            except TypeError:           # param_list could be an iterator
-                times = '?'
-            self.db.queries.append({
+            times = self._rows_sent
+            if times is None:
+                try:
+                    times = len(param_list)
+                except TypeError:           # param_list could be an iterator
+                    times = '?'
+            self.db.queries_log.append({
                 'sql': '%s times: %s' % (times, sql),
                 'time': '%.3f' % duration,
             })
-            logger.debug('(%.3f) %s; args=%s' % (duration, sql, param_list), extra={
-                'duration': duration,
-                'sql': sql,
-                'params': param_list
-            })
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('(%.3f) %s; args=%s', duration, sql, TruncatedRepr(param_list), extra={
+                    'duration': duration,
+                    'sql': sql,
+                    'params': param_list
+                })
+
+
+def _connect(conn_params):
+    return Database.connect(
+        host=conn_params['host'],
+        port=int(conn_params['port']),
+        user=conn_params['user'],
+        password=conn_params['password']
+    )
+
+
+def _interned(mapping):
+    return {sys.intern(key): sys.intern(value) for key, value in mapping.items()}
+
+
+_DATA_TYPES = {
+    'AutoField': 'INTEGER',
+    'BigIntegerField': 'BIGINT',
+    'BinaryField': 'BLOB',
+    'BooleanField': 'TINYINT',
+    'CharField': 'NVARCHAR(%(max_length)s)',
+    'DateField': 'DATE',
+    'DateTimeField': 'TIMESTAMP',
+    'DecimalField': 'DECIMAL(%(max_digits)s, %(decimal_places)s)',
+    'DurationField': 'BIGINT',
+    'FileField': 'NVARCHAR(%(max_length)s)',
+    'FilePathField': 'NVARCHAR(%(max_length)s)',
+    'FloatField': 'FLOAT',
+    'GenericIPAddressField': 'NVARCHAR(39)',
+    'ImageField': 'NVARCHAR(%(max_length)s)',
+    'IntegerField': 'INTEGER',
+    'NullBooleanField': 'TINYINT',
+    'OneToOneField': 'INTEGER',
+    'PositiveIntegerField': 'INTEGER',
+    'PositiveSmallIntegerField': 'SMALLINT',
+    'SlugField': 'NVARCHAR(%(max_length)s)',
+    'SmallIntegerField': 'SMALLINT',
+    'TextField': 'NCLOB',
+    'TimeField': 'TIME',
+    'URLField': 'NVARCHAR(%(max_length)s)',
+    'UUIDField': 'NVARCHAR(32)',
+}
+
+_OPERATORS = {
+    'exact': '= %s',
+    'iexact': '= UPPER(%s)',
+    'contains': 'LIKE %s',
+    'icontains': 'LIKE UPPER(%s)',
+    'regex': '~ %s',
+    'iregex': '~* %s',
+    'gt': '> %s',
+    'gte': '>= %s',
+    'lt': '< %s',
+    'lte': '<= %s',
+    'startswith': 'LIKE %s',
+    'endswith': 'LIKE %s',
+    'istartswith': 'LIKE UPPER(%s)',
+    'iendswith': 'LIKE UPPER(%s)',
+}
 
 
 class DatabaseWrapper(BaseDatabaseWrapper):
     vendor = 'hana'
 
-    data_types = {
-        'AutoField': 'INTEGER',
-        'BigIntegerField': 'BIGINT',
-        'BinaryField': 'BLOB',
-        'BooleanField': 'TINYINT',
-        'CharField': 'NVARCHAR(%(max_length)s)',
-        'DateField': 'DATE',
-        'DateTimeField': 'TIMESTAMP',
-        'DecimalField': 'DECIMAL(%(max_digits)s, %(decimal_places)s)',
-        'DurationField': 'BIGINT',
-        'FileField': 'NVARCHAR(%(max_length)s)',
-        'FilePathField': 'NVARCHAR(%(max_length)s)',
-        'FloatField': 'FLOAT',
-        'GenericIPAddressField': 'NVARCHAR(39)',
-        'ImageField': 'NVARCHAR(%(max_length)s)',
-        'IntegerField': 'INTEGER',
-        'NullBooleanField': 'TINYINT',
-        'OneToOneField': 'INTEGER',
-        'PositiveIntegerField': 'INTEGER',
-        'PositiveSmallIntegerField': 'SMALLINT',
-        'SlugField': 'NVARCHAR(%(max_length)s)',
-        'SmallIntegerField': 'SMALLINT',
-        'TextField': 'NCLOB',
-        'TimeField': 'TIME',
-        'URLField': 'NVARCHAR(%(max_length)s)',
-        'UUIDField': 'NVARCHAR(32)',
-    }
-
-    operators = {
-        'exact': '= %s',
-        'iexact': '= UPPER(%s)',
-        'contains': 'LIKE %s',
-        'icontains': 'LIKE UPPER(%s)',
-        'regex': '~ %s',
-        'iregex': '~* %s',
-        'gt': '> %s',
-        'gte': '>= %s',
-        'lt': '< %s',
-        'lte': '<= %s',
-        'startswith': 'LIKE %s',
-        'endswith': 'LIKE %s',
-        'istartswith': 'LIKE UPPER(%s)',
-        'iendswith': 'LIKE UPPER(%s)',
-    }
+    data_types = types.MappingProxyType(_interned(_DATA_TYPES))
+    operators = types.MappingProxyType(_interned(_OPERATORS))
 
     Database = Database
     SchemaEditorClass = DatabaseSchemaEditor
@@ -226,12 +357,29 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     introspection_class = DatabaseIntrospection
     ops_class = DatabaseOperations
 
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        # autocommit value last sent to the current connection, None if unknown
+        self._autocommit_cached = None
+
+    @cached_property
+    def bulk_insert_chunk(self):
+        chunk_size = self.settings_dict['OPTIONS'].get('BULK_INSERT_CHUNK', 500)
+        if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 1:
+            from django.core.exceptions import ImproperlyConfigured
+            raise ImproperlyConfigured(
+                'settings.DATABASES is improperly configured. '
+                "OPTIONS['BULK_INSERT_CHUNK'] must be a positive integer, got %r." % (chunk_size,)
+            )
+        return chunk_size
+
     def close(self):
         self.validate_thread_sharing()
         if self.connection is None:
             return
         self.connection.close()
         self.connection = None
+        self._autocommit_cached = None
 
     def get_connection_params(self):
         if not self.settings_dict['NAME']:
@@ -240,6 +388,12 @@ class DatabaseWrapper(BaseDatabaseWrapper):
                 'settings.DATABASES is improperly configured. '
                 'Please supply the NAME value.'
             )
+        if not _SCHEMA_NAME_RE.fullmatch(self.settings_dict['NAME'].upper()):
+            from django.core.exceptions import ImproperlyConfigured
+            raise ImproperlyConfigured(
+                'settings.DATABASES is improperly configured. '
+                '%r is not a valid schema name.' % self.settings_dict['NAME']
+            )
         conn_params = {}
         if self.settings_dict['USER']:
             conn_params['user'] = self.settings_dict['USER']
@@ -249,24 +403,52 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             conn_params['host'] = self.settings_dict['HOST']
         if self.settings_dict['PORT']:
             conn_params['port'] = self.settings_dict['PORT']
+        pool_options = self.settings_dict['OPTIONS'].get('POOL')
+        if pool_options is not None:
+            conn_params['pool'] = {
+                'min_size': int(pool_options.get('min_size', 0)),
+                'max_size': int(pool_options.get('max_size', 10)),
+                # pooled connections are reused across requests, so only a positive CONN_MAX_AGE limits their age
+                'max_age': pool_options.get('max_age', self.settings_dict['CONN_MAX_AGE'] or None),
+                'timeout': pool_options.get('timeout', 30),
+            }
         return conn_params
 
+    def get_pool(self, conn_params, pool_options):
+        pid = os.getpid()
+        key = (pid, frozenset(conn_params.items()))
+        with _pool_lock:
+            if key not in _pool:
+                # pools inherited from a parent process share its sockets, drop them without closing
+                for stale_key in [k for k in _pool if k[0] != pid]:
+                    del _pool[stale_key]
+                _pool[key] = ConnectionPool(functools.partial(_connect, conn_params), **pool_options)
+            return _pool[key]
+
     def get_new_connection(self, conn_params):
-        conn = Database.connect(
-            host=conn_params['host'],
-            port=int(conn_params['port']),
-            user=conn_params['user'],
-            password=conn_params['password']
-        )
+        pool_options = conn_params.pop('pool', None)
+        if pool_options is not None:
+            conn = self.get_pool(conn_params, pool_options).get()
+        else:
+            conn = _connect(conn_params)
+        self._autocommit_cached = None
         # set autocommit on by default
         self.default_schema = self.settings_dict['NAME']
         # make it upper case
         self.default_schema = self.default_schema.upper()
-        self.set_default_schema(conn)
+        try:
+            self.set_default_schema(conn)
+        except Exception:
+            # hand a pooled connection back instead of losing its slot
+            conn.close()
+            raise
         return conn
 
     def _set_autocommit(self, autocommit):
+        if autocommit == self._autocommit_cached:
+            return
         self.connection.setautocommit(autocommit)
+        self._autocommit_cached = autocommit
 
     def create_cursor(self, name=None):
         return CursorWrapper(self.connection.cursor(), self)
@@ -278,7 +460,15 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         pass
 
     def set_default_schema(self, connection):
-        connection.cursor().execute('set schema ' + self.default_schema)
+        if _connection_schemas.get(connection) == self.default_schema:
+            return
+        # SET SCHEMA doesn't accept parameters, the name is validated in get_connection_params
+        cursor = connection.cursor()
+        try:
+            cursor.execute('set schema ' + self.default_schema)
+        finally:
+            cursor.close()
+        _connection_schemas[connection] = self.default_schema
 
     def init_connection_state(self):
         pass # django thinks we need this function
@@ -289,7 +479,7 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         """
         self.ensure_connection()
         if self.features.uses_autocommit and managed:
-            self.connection.setautocommit(auto=False)
+            self._set_autocommit(False)
 
     def leave_transaction_management(self):
         """
@@ -307,17 +497,12 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             raise
         finally:
             # restore autocommit behavior
-            self.connection.setautocommit(auto=True)
+            self._set_autocommit(True)
         self._dirty = False
 
     def _commit(self):
         if self.connection is not None:
             return self.connection.commit()
-            # try:
-            #     return self.connection.commit()
-            # except Database.IntegrityError as e:
-            #     ### TODO: reraise instead of raise - six.reraise was deleted due to incompability with django 1.4
-            #     raise
 
     def schema_editor(self, *args, **kwargs):
         return DatabaseSchemaEditor(self, **kwargs)
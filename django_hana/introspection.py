@@ -1,7 +1,4 @@
-from __future__ import unicode_literals
-
 from django.db.backends.base.introspection import BaseDatabaseIntrospection, TableInfo, FieldInfo
-from django.utils import six
 
 
 class DatabaseIntrospection(BaseDatabaseIntrospection):
@@ -37,7 +34,7 @@ class DatabaseIntrospection(BaseDatabaseIntrospection):
         return result
 
     def table_name_converter(self, name):
-        return six.text_type(name.upper())
+        return str(name.upper())
 
     def get_table_description(self, cursor, table_name):
         """
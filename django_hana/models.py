@@ -1,9 +1,7 @@
 from django.contrib.gis.db import models
 from django.contrib.gis.db.backends.base.models import SpatialRefSysMixin
-from django.utils.encoding import python_2_unicode_compatible
 
 
-@python_2_unicode_compatible
 class HanaGeometryColumns(models.Model):
     """
     Maps to the HANA ST_GEOMETRY_COLUMNS view.
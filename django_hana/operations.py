@@ -1,5 +1,3 @@
-from __future__ import unicode_literals
-
 import uuid
 
 from django.contrib.gis.db.backends.base.adapter import WKTAdapter
@@ -8,7 +6,6 @@ from django.contrib.gis.db.backends.utils import SpatialOperator
 from django.contrib.gis.geos import GEOSGeometry as Geometry
 from django.contrib.gis.measure import Distance
 from django.db.backends.base.operations import BaseDatabaseOperations
-from django.utils import six
 from django.utils.encoding import force_text
 
 from .base import Database
@@ -202,12 +199,12 @@ class DatabaseOperations(BaseDatabaseOperations, BaseSpatialOperations):
             # HANA doesn't support timezone. If tzinfo is present truncate it.
             # Better set USE_TZ=False in settings.py
             import datetime
-            return six.text_type(
+            return str(
                 datetime.datetime(
                     value.year, value.month, value.day, value.hour, value.minute, value.second, value.microsecond
                 )
             )
-        return six.text_type(value)
+        return str(value)
 
     def lookup_cast(self, lookup_type, internal_type=None):
         if lookup_type in ('iexact', 'icontains', 'istartswith', 'iendswith'):
@@ -0,0 +1,116 @@
+"""
+Connection pool for PyHDB connections.
+"""
+import threading
+from time import monotonic
+
+from django.db.utils import OperationalError
+
+
+class PooledConnection(object):
+    """
+    Proxy of a PyHDB connection which is handed back to its pool on close()
+    """
+    def __init__(self, connection, pool):
+        self.connection = connection
+        self.pool = pool
+        self.created_at = monotonic()
+        self.checked_out = False
+
+    def __getattr__(self, attr):
+        return getattr(self.connection, attr)
+
+    def close(self):
+        # closing twice must not put the connection into the pool twice
+        if self.checked_out:
+            self.checked_out = False
+            self.pool.put(self)
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of connections created by factory.
+
+    get() waits up to timeout seconds while max_size connections are checked out. Connections older than max_age
+    seconds are closed instead of being reused.
+    """
+    def __init__(self, factory, min_size=0, max_size=10, max_age=None, timeout=30):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.timeout = timeout
+        self._idle = []
+        self._size = 0
+        self._condition = threading.Condition()
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append(PooledConnection(self.factory(), self))
+
+    def get(self):
+        conn = self._checkout()
+        conn.checked_out = True
+        return conn
+
+    def _checkout(self):
+        stale = []
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        try:
+            with self._condition:
+                while True:
+                    while self._idle:
+                        conn = self._idle.pop()
+                        if self._is_usable(conn):
+                            return conn
+                        stale.append(conn)
+                        self._release()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise OperationalError(
+                            'Timed out after %s seconds waiting for a pooled connection.' % self.timeout
+                        )
+                    self._condition.wait(remaining)
+        finally:
+            for conn in stale:
+                self._close(conn)
+        try:
+            return PooledConnection(self.factory(), self)
+        except Exception:
+            with self._condition:
+                self._release()
+            raise
+
+    def put(self, conn):
+        usable = self._is_usable(conn)
+        if usable:
+            try:
+                # don't hand out uncommitted work of the previous user
+                conn.connection.rollback()
+            except Exception:
+                usable = False
+        with self._condition:
+            if usable:
+                self._idle.append(conn)
+                self._condition.notify()
+            else:
+                self._release()
+        if not usable:
+            self._close(conn)
+
+    def _is_usable(self, conn):
+        if conn.connection.closed:
+            return False
+        return self.max_age is None or monotonic() - conn.created_at < self.max_age
+
+    def _release(self):
+        self._size -= 1
+        self._condition.notify()
+
+    def _close(self, conn):
+        if not conn.connection.closed:
+            try:
+                conn.connection.close()
+            except Exception:
+                pass
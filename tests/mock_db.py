@@ -1,4 +1,5 @@
 import mock
+from django.db import connection
 
 
 class MockCursor(object):
@@ -8,6 +9,17 @@ class MockCursor(object):
     def executemany(self, sql, param_list):
         raise NotImplementedError('Unexpected call to "executemany". You need to use "patch_db_executemany".')
 
+    def prepare(self, statement):
+        raise NotImplementedError('Unexpected call to "prepare". You need to use "patch_db_prepare".')
+
+    def get_prepared_statement(self, statement_id):
+        raise NotImplementedError(
+            'Unexpected call to "get_prepared_statement". You need to use "patch_db_get_prepared_statement".'
+        )
+
+    def execute_prepared(self, prepared_statement, multi_row_parameters):
+        raise NotImplementedError('Unexpected call to "execute_prepared". You need to use "patch_db_execute_prepared".')
+
     def fetchone(self):
         raise NotImplementedError('Unexpected call to "fetchone". You need to use "patch_db_fetchone".')
 
@@ -48,6 +60,19 @@ def mock_connect(*args, **kwargs):
 mock_hana = mock.patch('pyhdb.connect', mock_connect)
 patch_db_execute = mock.patch.object(MockCursor, 'execute')
 patch_db_executemany = mock.patch.object(MockCursor, 'executemany')
+patch_db_prepare = mock.patch.object(MockCursor, 'prepare')
+patch_db_get_prepared_statement = mock.patch.object(MockCursor, 'get_prepared_statement')
+patch_db_execute_prepared = mock.patch.object(MockCursor, 'execute_prepared')
 patch_db_fetchone = mock.patch.object(MockCursor, 'fetchone')
 patch_db_fetchmany = mock.patch.object(MockCursor, 'fetchmany')
 patch_db_fetchall = mock.patch.object(MockCursor, 'fetchall')
+
+
+class DatabaseConnectionMixin(object):
+    maxDiff = None
+
+    @mock_hana
+    @patch_db_execute
+    @patch_db_fetchone
+    def setUp(self, mock_fetchone, mock_execute):
+        connection.ensure_connection()
@@ -0,0 +1,273 @@
+import copy
+import json
+import unittest
+
+import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, utils
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
+from mock import call
+
+from django_hana.base import CursorDebugWrapper, Database, DatabaseWrapper, _pool
+
+from .mock_db import (
+    DatabaseConnectionMixin, MockConnection, MockCursor, mock_hana, patch_db_execute, patch_db_execute_prepared,
+    patch_db_executemany, patch_db_fetchall, patch_db_fetchmany, patch_db_get_prepared_statement, patch_db_prepare
+)
+
+
+class TestCursorWrapper(DatabaseConnectionMixin, unittest.TestCase):
+    insert_sql = 'INSERT INTO "TEST_DHP_SIMPLEMODEL" (id,"CHAR_FIELD") VALUES (test_dhp_simplemodel_id_seq.nextval, %s)'
+    expected_insert_sql = (
+        'INSERT INTO "TEST_DHP_SIMPLEMODEL" (id,"CHAR_FIELD") VALUES (test_dhp_simplemodel_id_seq.nextval, ?)'
+    )
+
+    @mock_hana
+    @patch_db_executemany
+    def test_executemany_sequence(self, mock_executemany):
+        param_list = (['foobar'], ['barbaz'], ['bazqux'])
+        expected_statements = [
+            call(self.expected_insert_sql, param_list),
+        ]
+
+        with mock.patch.object(connection, 'bulk_insert_chunk', 2):
+            with connection.cursor() as cursor:
+                cursor.executemany(self.insert_sql, param_list)
+
+        self.assertSequenceEqual(mock_executemany.call_args_list, expected_statements)
+
+    @mock_hana
+    @patch_db_prepare
+    @patch_db_get_prepared_statement
+    @patch_db_execute_prepared
+    def test_executemany_iterator(self, mock_execute_prepared, mock_get_prepared_statement, mock_prepare):
+        statement = mock.sentinel.statement
+        mock_prepare.return_value = 1234
+        mock_get_prepared_statement.return_value = statement
+        expected_statements = [
+            call(statement, (['foobar'], ['barbaz'])),
+            call(statement, (['bazqux'],)),
+        ]
+
+        param_list = (row for row in (['foobar'], ['barbaz'], ['bazqux']))
+        with mock.patch.object(connection, 'bulk_insert_chunk', 2):
+            with mock.patch.object(connection, 'force_debug_cursor', True):
+                with connection.cursor() as cursor:
+                    cursor.executemany(self.insert_sql, param_list)
+
+        mock_prepare.assert_called_once_with(self.expected_insert_sql)
+        mock_get_prepared_statement.assert_called_once_with(1234)
+        self.assertSequenceEqual(mock_execute_prepared.call_args_list, expected_statements)
+        self.assertEqual(connection.queries[-1]['sql'], '3 times: %s' % self.insert_sql)
+
+    @mock_hana
+    @patch_db_prepare
+    @patch_db_get_prepared_statement
+    @patch_db_execute_prepared
+    def test_executemany_iterator_update(self, mock_execute_prepared, mock_get_prepared_statement, mock_prepare):
+        statement = mock.sentinel.statement
+        mock_prepare.return_value = 1234
+        mock_get_prepared_statement.return_value = statement
+        expected_statements = [
+            call(statement, (['foobar', 1], ['barbaz', 2])),
+        ]
+
+        param_list = (row for row in (['foobar', 1], ['barbaz', 2]))
+        with connection.cursor() as cursor:
+            cursor.executemany('UPDATE "TEST_DHP_SIMPLEMODEL" SET "CHAR_FIELD" = %s WHERE "ID" = %s', param_list)
+
+        mock_prepare.assert_called_once_with('UPDATE "TEST_DHP_SIMPLEMODEL" SET "CHAR_FIELD" = ? WHERE "ID" = ?')
+        mock_get_prepared_statement.assert_called_once_with(1234)
+        self.assertSequenceEqual(mock_execute_prepared.call_args_list, expected_statements)
+
+    @mock_hana
+    @patch_db_fetchall
+    @patch_db_fetchmany
+    def test_iterate(self, mock_fetchmany, mock_fetchall):
+        for arraysize, expected_size in ((1, GET_ITERATOR_CHUNK_SIZE), (1000, 1000)):
+            mock_fetchmany.reset_mock()
+            mock_fetchmany.side_effect = [[(1,), (2,)], [(3,)], [], [(4,)]]
+
+            with connection.create_cursor() as cursor:
+                cursor.cursor.arraysize = arraysize
+                self.assertEqual(list(cursor), [(1,), (2,), (3,)])
+
+            self.assertSequenceEqual(mock_fetchmany.call_args_list, [call(expected_size)] * 3)
+        mock_fetchall.assert_not_called()
+
+    @mock_hana
+    def test_debug_cursor_closed_once(self):
+        for close_in_block in (False, True):
+            with mock.patch.object(MockCursor, 'close') as mock_close:
+                with mock.patch.object(connection, 'force_debug_cursor', True):
+                    with connection.cursor() as cursor:
+                        self.assertIsInstance(cursor, CursorDebugWrapper)
+                        if close_in_block:
+                            cursor.close()
+
+            mock_close.assert_called_once_with()
+
+    @mock_hana
+    @patch_db_execute
+    def test_queries_log(self, mock_execute):
+        with mock.patch.object(connection, 'force_debug_cursor', True):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT "CHAR_FIELD" FROM "TEST_DHP_SIMPLEMODEL" WHERE "ID" = %s', [1])
+
+        query = connection.queries[-1]
+        self.assertIsInstance(query['sql'], str)
+        self.assertIn('SELECT "CHAR_FIELD" FROM "TEST_DHP_SIMPLEMODEL"', query['sql'])
+        json.dumps(connection.queries)
+
+    @mock_hana
+    @patch_db_execute
+    def test_integrity_error_code(self, mock_execute):
+        error = Database.DatabaseError('unique constraint violated', code=301)
+        mock_execute.side_effect = error
+
+        with connection.cursor() as cursor:
+            with self.assertRaises(utils.IntegrityError) as context:
+                cursor.execute('INSERT INTO "TEST_DHP_SIMPLEMODEL" ("CHAR_FIELD") VALUES (%s)', ['foobar'])
+
+        self.assertIs(context.exception.__cause__, error)
+        self.assertEqual(context.exception.args, error.args)
+
+    @mock_hana
+    @patch_db_execute
+    def test_database_error(self, mock_execute):
+        error = Database.DatabaseError('invalid table name', code=259)
+        mock_execute.side_effect = error
+
+        with connection.cursor() as cursor:
+            with self.assertRaises(utils.DatabaseError) as context:
+                cursor.execute('SELECT * FROM "MISSING"')
+
+        self.assertNotIsInstance(context.exception, utils.IntegrityError)
+        self.assertIs(context.exception.__cause__, error)
+
+
+class TestPlaceholders(DatabaseConnectionMixin, unittest.TestCase):
+    @mock_hana
+    @patch_db_execute
+    def test_placeholders_in_string_literals(self, mock_execute):
+        expected_statements = [
+            call(
+                'SELECT \'%s\', \'it\'\'s %s\', ? FROM "TEST_DHP_SIMPLEMODEL" WHERE "CHAR_FIELD" = ?',
+                ['foo', 'bar']
+            ),
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT \'%s\', \'it\'\'s %s\', %s FROM "TEST_DHP_SIMPLEMODEL" WHERE "CHAR_FIELD" = %s',
+                ['foo', 'bar']
+            )
+
+        self.assertSequenceEqual(mock_execute.call_args_list, expected_statements)
+
+    @mock_hana
+    @patch_db_execute
+    def test_escaped_percent_next_to_placeholder(self, mock_execute):
+        expected_statements = [
+            call('SELECT "CHAR_FIELD" FROM "TEST_DHP_SIMPLEMODEL" WHERE "CHAR_FIELD" LIKE ?%%', ['foo']),
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT "CHAR_FIELD" FROM "TEST_DHP_SIMPLEMODEL" WHERE "CHAR_FIELD" LIKE %s%%', ['foo'])
+
+        self.assertSequenceEqual(mock_execute.call_args_list, expected_statements)
+
+
+class TestDatabaseWrapper(unittest.TestCase):
+    def make_wrapper(self, **settings):
+        settings_dict = copy.deepcopy(connection.settings_dict)
+        settings_dict.update(settings)
+        return DatabaseWrapper(settings_dict)
+
+    def test_bulk_insert_chunk(self):
+        self.assertEqual(self.make_wrapper().bulk_insert_chunk, 500)
+        self.assertEqual(self.make_wrapper(OPTIONS={'BULK_INSERT_CHUNK': 1000}).bulk_insert_chunk, 1000)
+
+    def test_invalid_bulk_insert_chunk(self):
+        for chunk_size in (0, -1, '500', 2.5, True, None):
+            wrapper = self.make_wrapper(OPTIONS={'BULK_INSERT_CHUNK': chunk_size})
+            with self.assertRaises(ImproperlyConfigured):
+                wrapper.bulk_insert_chunk
+
+    @mock_hana
+    def test_invalid_schema_name(self):
+        for name in ('bad-name', 'foo\n'):
+            wrapper = self.make_wrapper(NAME=name)
+            with mock.patch('django_hana.base._connect') as mock_connect:
+                with self.assertRaises(ImproperlyConfigured):
+                    wrapper.ensure_connection()
+            mock_connect.assert_not_called()
+
+    @mock_hana
+    @mock.patch.dict('django_hana.base._pool', clear=True)
+    def test_pooled_connection_returned_on_setup_failure(self):
+        wrapper = self.make_wrapper(OPTIONS={'POOL': {'max_size': 1, 'timeout': 0.01}})
+        with patch_db_execute as mock_execute:
+            mock_execute.side_effect = Database.DatabaseError('set schema failed')
+            with self.assertRaises(utils.DatabaseError):
+                wrapper.ensure_connection()
+
+            mock_execute.side_effect = None
+            wrapper.ensure_connection()
+        self.assertIsNotNone(wrapper.connection)
+        wrapper.close()
+
+    @mock_hana
+    @mock.patch.dict('django_hana.base._pool', clear=True)
+    def test_pool_per_process(self):
+        wrapper = self.make_wrapper(OPTIONS={'POOL': {}})
+        conn_params = wrapper.get_connection_params()
+        pool_options = conn_params.pop('pool')
+        with mock.patch('os.getpid', return_value=1):
+            parent_pool = wrapper.get_pool(conn_params, pool_options)
+            self.assertIs(wrapper.get_pool(conn_params, pool_options), parent_pool)
+        with mock.patch('os.getpid', return_value=2):
+            child_pool = wrapper.get_pool(conn_params, pool_options)
+        self.assertIsNot(child_pool, parent_pool)
+        self.assertNotIn(parent_pool, _pool.values())
+
+    @mock_hana
+    def test_set_autocommit_skips_repeated_value(self):
+        wrapper = self.make_wrapper()
+        with patch_db_execute:
+            wrapper.ensure_connection()
+        with mock.patch.object(MockConnection, 'setautocommit', autospec=True) as mock_setautocommit:
+            wrapper.set_autocommit(False)
+            wrapper.set_autocommit(False)
+            wrapper.set_autocommit(True)
+        self.assertSequenceEqual(
+            mock_setautocommit.call_args_list, [call(wrapper.connection, False), call(wrapper.connection, True)]
+        )
+
+    @mock_hana
+    def test_autocommit_cache_reset(self):
+        wrapper = self.make_wrapper()
+        with patch_db_execute:
+            wrapper.ensure_connection()
+            self.assertTrue(wrapper._autocommit_cached)
+            wrapper.close()
+            self.assertIsNone(wrapper._autocommit_cached)
+
+            wrapper._autocommit_cached = True
+            wrapper.get_new_connection(wrapper.get_connection_params())
+            self.assertIsNone(wrapper._autocommit_cached)
+
+    @mock_hana
+    @mock.patch.dict('django_hana.base._pool', clear=True)
+    def test_pooled_connection_autocommit_restored(self):
+        wrapper = self.make_wrapper(OPTIONS={'POOL': {'max_size': 1}})
+        with patch_db_execute:
+            with mock.patch.object(MockConnection, 'setautocommit', autospec=True) as mock_setautocommit:
+                wrapper.ensure_connection()
+                conn = wrapper.connection.connection
+                wrapper.set_autocommit(False)
+                wrapper.close()
+                mock_setautocommit.reset_mock()
+                wrapper.ensure_connection()
+        self.assertIs(wrapper.connection.connection, conn)
+        mock_setautocommit.assert_called_once_with(conn, True)
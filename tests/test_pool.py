@@ -0,0 +1,114 @@
+import threading
+import unittest
+
+import mock
+from django.db.utils import OperationalError
+
+from django_hana.pool import ConnectionPool
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_rollback = False
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise Exception('rollback failed')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+
+    def factory(self):
+        conn = FakeConnection()
+        self.created.append(conn)
+        return conn
+
+    def test_min_size(self):
+        pool = ConnectionPool(self.factory, min_size=2)
+        self.assertEqual(len(self.created), 2)
+        pool.get()
+        pool.get()
+        self.assertEqual(len(self.created), 2)
+
+    def test_reuse(self):
+        pool = ConnectionPool(self.factory)
+        conn = pool.get()
+        conn.close()
+        self.assertIs(pool.get(), conn)
+        self.assertEqual(len(self.created), 1)
+
+    def test_rollback_on_return(self):
+        pool = ConnectionPool(self.factory)
+        conn = pool.get()
+        conn.close()
+        self.assertEqual(conn.connection.rollbacks, 1)
+        self.assertFalse(conn.connection.closed)
+
+    def test_failed_rollback_discards_connection(self):
+        pool = ConnectionPool(self.factory, max_size=1)
+        conn = pool.get()
+        conn.connection.fail_rollback = True
+        conn.close()
+        self.assertTrue(conn.connection.closed)
+        self.assertIsNot(pool.get().connection, conn.connection)
+
+    def test_close_twice(self):
+        pool = ConnectionPool(self.factory)
+        conn = pool.get()
+        conn.close()
+        conn.close()
+        self.assertIsNot(pool.get().connection, pool.get().connection)
+        self.assertEqual(conn.connection.rollbacks, 1)
+
+    def test_max_size_blocks_until_returned(self):
+        pool = ConnectionPool(self.factory, max_size=1)
+        conn = pool.get()
+        checked_out = []
+        thread = threading.Thread(target=lambda: checked_out.append(pool.get()))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+
+        conn.close()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(checked_out, [conn])
+        self.assertEqual(len(self.created), 1)
+
+    def test_max_size_timeout(self):
+        pool = ConnectionPool(self.factory, max_size=1, timeout=0.01)
+        pool.get()
+        with self.assertRaises(OperationalError):
+            pool.get()
+
+    def test_max_age_eviction(self):
+        pool = ConnectionPool(self.factory, max_age=60)
+        with mock.patch('django_hana.pool.monotonic', return_value=1000):
+            conn = pool.get()
+        conn.close()
+        with mock.patch('django_hana.pool.monotonic', return_value=1061):
+            new_conn = pool.get()
+        self.assertTrue(conn.connection.closed)
+        self.assertIsNot(new_conn.connection, conn.connection)
+
+    def test_closed_connection_is_not_reused(self):
+        pool = ConnectionPool(self.factory, max_size=1)
+        conn = pool.get()
+        conn.connection.closed = True
+        conn.close()
+        self.assertIsNot(pool.get().connection, conn.connection)
+
+    def test_factory_failure_releases_slot(self):
+        factory = mock.Mock(side_effect=[Exception('connect failed'), FakeConnection()])
+        pool = ConnectionPool(factory, max_size=1, timeout=0.01)
+        with self.assertRaises(Exception):
+            pool.get()
+        self.assertIsNotNone(pool.get())
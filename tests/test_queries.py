@@ -7,25 +7,16 @@ import django
 import mock
 from django.db import connection, models
 from django.db.models.fields.files import FieldFile
-from django.utils import six
 from mock import call
 
 from django_hana.base import Database
 
-from .mock_db import mock_hana, patch_db_execute, patch_db_executemany, patch_db_fetchmany, patch_db_fetchone
+from .mock_db import (
+    DatabaseConnectionMixin, mock_hana, patch_db_execute, patch_db_executemany, patch_db_fetchmany, patch_db_fetchone
+)
 from .models import ComplexModel, RelationModel, SimpleColumnModel, SimpleModel, SimpleRowModel
 
 
-class DatabaseConnectionMixin(object):
-    maxDiff = None
-
-    @mock_hana
-    @patch_db_execute
-    @patch_db_fetchone
-    def setUp(self, mock_fetchone, mock_execute):
-        connection.ensure_connection()
-
-
 class TestSetup(DatabaseConnectionMixin, unittest.TestCase):
     @mock_hana
     @patch_db_execute
@@ -75,7 +66,7 @@ class TestSetup(DatabaseConnectionMixin, unittest.TestCase):
 
     @mock_hana
     @patch_db_execute
-    @mock.patch('__builtin__.hash' if six.PY2 else 'builtins.hash', mock.Mock(side_effect=[  # only Django 1.8
+    @mock.patch('builtins.hash', mock.Mock(side_effect=[  # only Django 1.8
         3107422457,
         1315547209,
         1095174084,